@@ -12,19 +12,23 @@ Presupuesto 50-20-30 · v7.1
 • Eliminación de ingresos/gastos vía multiselect (sin errores)  
 ────────────────────────────────────────────────────────────────────────
 Requisitos:
-    pip install streamlit pandas matplotlib python-dateutil
+    pip install streamlit numpy pandas matplotlib python-dateutil orjson
 Ejecutar:
     streamlit run Presupuesto.py
 """
 
 from __future__ import annotations
-import os, json, hashlib, datetime as dt
-from dataclasses import dataclass, asdict, field
+import io, os, hmac, hashlib, calendar, datetime as dt
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import List, Dict
 
+import orjson
+import numpy as np
 import pandas as pd
 import streamlit as st
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from dateutil.relativedelta import relativedelta
 
 # ─ utilidades ──────────────────────────────────────────────────────
@@ -33,20 +37,38 @@ os.makedirs(DATA_DIR, exist_ok=True)
 TODAY   = dt.date.today()
 _hash   = lambda s: hashlib.sha256(s.encode()).hexdigest()
 _rerun  = lambda: (st.rerun() if hasattr(st, "rerun") else st.experimental_rerun())
-_ym     = lambda iso: (dt.date.fromisoformat(iso).year,
-                       dt.date.fromisoformat(iso).month)
+_ym     = lru_cache(maxsize=None)(lambda iso: (int(iso[:4]), int(iso[5:7])))   # "YYYY-MM-DD"
 first_m = lambda y, m: dt.date(y, m, 1)
-_san    = lambda s: "".join(c if c.isalnum() else "_" for c in s)
+_SAN    = {i: "_" for i in range(128) if not chr(i).isalnum()}   # tabla ASCII para str.translate
+_san    = lambda s: s.translate(_SAN) if s.isascii() else \
+                    "".join(c if c.isalnum() else "_" for c in s)
+def _fstamp(path: str) -> tuple:
+    """(mtime_ns, tamaño) de un solo os.stat: cambia en cada escritura aunque el reloj no avance."""
+    try: s = os.stat(path)
+    except FileNotFoundError: return (0, 0)
+    return (s.st_mtime_ns, s.st_size)
 
 # ─ autenticación ─────────────────────────────────────────────────
 USERS_FILE = os.path.join(DATA_DIR, "users.json")
-load_users = lambda: json.load(open(USERS_FILE, "r", encoding="utf-8")) \
-                    if os.path.exists(USERS_FILE) else {}
-save_users = lambda d: json.dump(d, open(USERS_FILE, "w", encoding="utf-8"), indent=2)
+@st.cache_data(show_spinner=False, max_entries=4)      # sólo sirve la versión vigente
+def _users_cached(stamp: tuple) -> Dict:
+    return orjson.loads(open(USERS_FILE, "rb").read()) if stamp != (0, 0) else {}
+load_users = lambda: _users_cached(_fstamp(USERS_FILE))
+save_users = lambda d: open(USERS_FILE, "wb").write(orjson.dumps(d, option=orjson.OPT_INDENT_2))
+# scrypt con sal por usuario; sólo se deriva al registrar / iniciar sesión
+_kdf = lambda pw, salt: hashlib.scrypt(pw.encode(), salt=bytes.fromhex(salt),
+                                       n=2**14, r=8, p=1, dklen=32).hex()
 def register_user(u: str, p: str):
-    users = load_users(); users[u] = {"pw": _hash(p)}; save_users(users)
+    salt = os.urandom(16).hex()
+    users = load_users(); users[u] = {"pw": _kdf(p, salt), "salt": salt}; save_users(users)
 def authenticate(u: str, p: str) -> bool:
-    users = load_users(); return u in users and users[u]["pw"] == _hash(p)
+    users = load_users()
+    if u not in users: return False
+    rec = users[u]
+    if "salt" in rec: return hmac.compare_digest(rec["pw"], _kdf(p, rec["salt"]))
+    # legacy: sha256 sin sal → se migra a scrypt en el primer inicio de sesión correcto
+    if not hmac.compare_digest(rec["pw"], _hash(p)): return False
+    register_user(u, p); return True
 
 # ─ modelos de datos ────────────────────────────────────────────────
 @dataclass
@@ -100,11 +122,38 @@ class Budget:
     incomes  : List[Transaction] = field(default_factory=list)
     expenses : List[Transaction] = field(default_factory=list)
     goals    : List[Goal]        = field(default_factory=list)
-    def _tot(self, seq, y, m): return sum(t.amount for t in seq if _ym(t.date)==(y, m))
-    def cashflow_m(self, y, m): return self._tot(self.incomes, y, m) - self._tot(self.expenses, y, m)
+    gen      : int               = 0     # generación del snapshot; el log sólo aplica a la suya
+    def cashflow_y(self, y) -> np.ndarray:
+        """Cash-flow de cada mes (ene..dic) del año y, en una sola pasada."""
+        cf = np.zeros(12)
+        for sign, seq in ((1, self.incomes), (-1, self.expenses)):
+            for t in seq:
+                ty, tm = _ym(t.date)
+                if ty == y: cf[tm - 1] += sign * t.amount
+        return cf
+
+def _by_name(b: Budget):
+    """Índices nombre → cuenta / tarjeta para actualizar saldos en O(1)."""
+    return {a.name: a for a in b.accounts}, {c.name: c for c in b.cards}
 
 # ─ persistencia ───────────────────────────────────────────────────
-_f = lambda u, p: os.path.join(DATA_DIR, f"{_hash(u)}__{_hash(p)}.json")
+# Cada perfil = snapshot (.json) + log de mutaciones (.jsonl, un evento por línea).
+# `uh` es el hash del usuario, calculado una vez al iniciar sesión (session_state.user_hash).
+def _ph(p: str) -> str:
+    cache = st.session_state.setdefault("prof_hash", {})
+    if p not in cache: cache[p] = _hash(p)
+    return cache[p]
+_f     = lambda uh, p: os.path.join(DATA_DIR, f"{uh}__{_ph(p)}.json")
+_log   = lambda uh, p: os.path.splitext(_f(uh, p))[0] + ".jsonl"
+_stamp = lambda uh, p: (_fstamp(_f(uh, p)), _fstamp(_log(uh, p)))
+_log_len = lambda uh, p: sum(1 for _ in open(_log(uh, p), "rb")) \
+                         if os.path.exists(_log(uh, p)) else 0
+SNAPSHOT_EVERY = 200    # líneas de log antes de compactar en un snapshot
+_HEAD = ("accounts", "cards", "debts", "goals")
+_head = lambda b: {k: getattr(b, k) for k in _HEAD}
+# huella de lo editable en el sidebar; se fija tras cargar (session_state.snapshot_hash)
+_head_hash = lambda b: hash(orjson.dumps(_head(b)))
+_dirty     = lambda b: _head_hash(b) != st.session_state.get("snapshot_hash")
 def _tx_clean(d: Dict) -> Dict:
     if "account" in d and "source" not in d:
         d["source"] = d.pop("account")
@@ -117,39 +166,100 @@ def _goal_clean(d: Dict) -> Dict:
     g.setdefault("name", f"Meta {len(g)}")
     return g
 
-def load_budget(u: str, p: str) -> Budget:
-    if not os.path.exists(_f(u, p)):
-        return Budget()
-    d = json.load(open(_f(u, p), "r", encoding="utf-8"))
-    return Budget(
-        accounts =[Account(**a) for a in d.get("accounts", [])],
-        cards    =[CreditCard(**c) for c in d.get("cards",    [])],
-        debts    =[Debt(**v)       for v in d.get("debts",    [])],
-        incomes  =[Transaction(**_tx_clean(t)) for t in d.get("incomes",  [])],
-        expenses =[Transaction(**_tx_clean(t)) for t in d.get("expenses", [])],
-        goals    =[Goal(**_goal_clean(g))      for g in d.get("goals",    [])],
-    )
-def save_budget(u: str, p: str, b: Budget):
-    json.dump(asdict(b), open(_f(u, p), "w", encoding="utf-8"), indent=2)
+def _replay(d: Dict, e: Dict):
+    if e["op"] == "head":
+        d.update({k: e[k] for k in _HEAD})
+    elif e["op"] == "add":
+        d.setdefault(e["kind"], []).append(e["tx"])
+    elif e["op"] == "del":
+        drop = set(e["idx"])
+        d[e["kind"]] = [t for i, t in enumerate(d.get(e["kind"], [])) if i not in drop]
+
+def _exp_columns(expenses: List[Transaction]) -> Dict:
+    """Vista columnar (SoA) de los gastos para filtros mensuales vectorizados."""
+    return {
+        "date"  : np.array([t.date for t in expenses], dtype="datetime64[D]"),
+        "amount": np.fromiter((t.amount for t in expenses), dtype=np.float64, count=len(expenses)),
+        "cat"   : pd.Categorical([t.category for t in expenses]),
+    }
+
+def load_budget(uh: str, p: str) -> Budget:
+    b = Budget()
+    if os.path.exists(_f(uh, p)):
+        d = orjson.loads(open(_f(uh, p), "rb").read())
+        gen = d.get("gen", 0)
+        if os.path.exists(_log(uh, p)):
+            for line in open(_log(uh, p), "rb"):
+                if not line.strip(): continue
+                e = orjson.loads(line)
+                # líneas de una generación anterior ya están absorbidas en el snapshot
+                if e.get("gen", 0) == gen: _replay(d, e)
+        b = Budget(
+            accounts =[Account(**a) for a in d.get("accounts", [])],
+            cards    =[CreditCard(**c) for c in d.get("cards",    [])],
+            debts    =[Debt(**v)       for v in d.get("debts",    [])],
+            incomes  =[Transaction(**_tx_clean(t)) for t in d.get("incomes",  [])],
+            expenses =[Transaction(**_tx_clean(t)) for t in d.get("expenses", [])],
+            goals    =[Goal(**_goal_clean(g))      for g in d.get("goals",    [])],
+            gen      =gen,
+        )
+    # atributo privado: orjson lo omite al guardar y cada mutación lo reconstruye al recargar
+    b._exp_arr = _exp_columns(b.expenses)
+    b._subcats = defaultdict(set)       # categoría → sub-cats ya usadas en gastos
+    for t in b.expenses: b._subcats[t.category].add(t.subcat)
+    return b
+# mtime + tamaño forman parte de la clave: cada escritura invalida la caché
+@st.cache_data(show_spinner=False, max_entries=32)     # cada escritura deja obsoleta la anterior
+def _load_cached(uh: str, p: str, stamp: tuple) -> Budget:
+    return load_budget(uh, p)
+def save_budget(uh: str, p: str, b: Budget):
+    """Snapshot completo de una nueva generación; el log anterior queda absorbido."""
+    b.gen += 1
+    tmp = _f(uh, p) + ".tmp"
+    with open(tmp, "wb") as fh:
+        # orjson serializa dataclasses de forma nativa: sin pasar por asdict()
+        fh.write(orjson.dumps(b, option=orjson.OPT_INDENT_2))
+    os.replace(tmp, _f(uh, p))      # atómico: nunca queda un snapshot a medias
+    if os.path.exists(_log(uh, p)):
+        os.remove(_log(uh, p))
+def log_mutation(uh: str, p: str, b: Budget, *events: Dict):
+    """Añade al log el estado de cuentas/tarjetas/deudas/metas más los eventos
+    de ingresos/gastos ("add"/"del"), sin reescribir todo el historial."""
+    # +1 por la línea "head" que acompaña a cada mutación
+    if not os.path.exists(_f(uh, p)) or _log_len(uh, p) + 1 + len(events) >= SNAPSHOT_EVERY:
+        return save_budget(uh, p, b)
+    head = {"op": "head", **_head(b)}
+    with open(_log(uh, p), "ab") as fh:
+        fh.write(b"".join(orjson.dumps({**e, "gen": b.gen}) + b"\n" for e in (head, *events)))
 
 # ─ gráficos ───────────────────────────────────────────────────────
+# Se cachea el PNG ya renderizado (bytes inmutables, seguros entre sesiones/hilos), no la
+# Figure; ésta se crea fuera de pyplot para que el GC la libere. Clave: hash del DataFrame.
+_fig_cache = st.cache_data(show_spinner=False, max_entries=32)
+# mismos parámetros que st.pyplot (dpi=200, recorte ajustado); se muestran a todo el ancho
+def _png(fig: Figure) -> bytes:
+    buf = io.BytesIO(); fig.savefig(buf, format="png", bbox_inches="tight", dpi=200); return buf.getvalue()
+
+@_fig_cache
 def pie50(df):
-    fig, ax = plt.subplots()
+    fig = Figure(); ax = fig.subplots()
     vals = df["Monto"].values; mask = vals > 1e-2
     if vals[mask].sum() == 0:
         ax.text(0.5, 0.5, "Sin datos", ha="center", va="center")
     else:
         ax.pie(vals[mask], labels=df.index[mask], autopct=lambda p: f"{p:.1f}%", startangle=90)
-    ax.axis("equal"); return fig
+    ax.axis("equal"); return _png(fig)
 
+@_fig_cache
 def bar_spend(df):
-    fig, ax = plt.subplots()
+    fig = Figure(); ax = fig.subplots()
     df.plot(kind="bar", ax=ax, legend=False)
-    ax.set_ylabel("RD$"); return fig
+    ax.set_ylabel("RD$"); return _png(fig)
 
+@_fig_cache
 def line_month(df):
-    fig, ax = plt.subplots()
-    df.plot(ax=ax); ax.set_ylabel("RD$"); ax.set_xlabel("Mes"); return fig
+    fig = Figure(); ax = fig.subplots()
+    df.plot(ax=ax); ax.set_ylabel("RD$"); ax.set_xlabel("Mes"); return _png(fig)
 
 # ─ login / registro ──────────────────────────────────────────────
 def login_screen():
@@ -159,37 +269,49 @@ def login_screen():
         u = st.text_input("Usuario", key="login_user")
         p = st.text_input("Contraseña", type="password", key="login_pass")
         if st.button("Entrar", key="login_btn") and authenticate(u, p):
-            st.session_state.user = u; _rerun()
+            st.session_state.user, st.session_state.user_hash = u, _hash(u); _rerun()
     with t2:
         nu = st.text_input("Nuevo usuario", key="reg_user")
-        np = st.text_input("Contraseña", type="password", key="reg_pass")
-        if st.button("Registrar", key="reg_btn") and nu and np:
+        npw = st.text_input("Contraseña", type="password", key="reg_pass")
+        if st.button("Registrar", key="reg_btn") and nu and npw:
             if nu in load_users(): st.error("Ese usuario ya existe")
-            else: register_user(nu, np); st.success("✅ Usuario creado")
+            else: register_user(nu, npw); st.success("✅ Usuario creado")
 
 # ─ selección de perfil ────────────────────────────────────────────
 def choose_profile(user: str):
-    key = f"profiles_{user}"
+    key, uh = f"profiles_{user}", st.session_state.user_hash
     st.session_state.setdefault(key, ["Principal"])
     profs = st.session_state[key]
     st.session_state.profile = st.radio("Perfil", profs, horizontal=True, key="pf_radio")
     with st.expander("Gestionar perfiles"):
-        np = st.text_input("Nuevo perfil", key="pf_new")
-        if st.button("Añadir", key="pf_add") and np and np not in profs:
-            profs.append(np); _rerun()
+        npf = st.text_input("Nuevo perfil", key="pf_new")
+        if st.button("Añadir", key="pf_add") and npf and npf not in profs:
+            profs.append(npf); _rerun()
         if len(profs) > 1:
             dp = st.selectbox("Eliminar perfil", profs, key="pf_del_sel")
             if st.button("Borrar", key="pf_del_btn") and dp != st.session_state.profile:
                 profs.remove(dp)
-                if os.path.exists(_f(user, dp)):
-                    os.remove(_f(user, dp))
+                for path in (_f(uh, dp), _log(uh, dp)):
+                    if os.path.exists(path): os.remove(path)
                 _rerun()
     st.divider()
 
 # ─ dashboard ─────────────────────────────────────────────────────
+# "RD$ 1,234" como texto ya formateado (sin Styler); ojo: esas columnas ordenan como texto
+_money = lambda s: s.map("RD$ {:,.0f}".format, na_action="ignore")
+_RD_COL = st.column_config.NumberColumn(format="RD$ %,.0f")   # formato en el cliente, sin Styler
+_f64   = lambda it, n: np.fromiter(it, dtype=np.float64, count=n)
+
+def _tx_frame(seq: List[Transaction]) -> pd.DataFrame:
+    """DataFrame por columnas (sin un dict por fila) con los campos de Transaction."""
+    cols = {k: [getattr(t, k) for t in seq] for k in Transaction.__annotations__}
+    cols["amount"] = _f64((t.amount for t in seq), len(seq))
+    return pd.DataFrame(cols)
+
 def dashboard():
-    user, prof = st.session_state.user, st.session_state.profile
-    b = load_budget(user, prof)
+    uh, prof = st.session_state.user_hash, st.session_state.profile
+    b = _load_cached(uh, prof, _stamp(uh, prof))
+    st.session_state.snapshot_hash = _head_hash(b)
     y, m = TODAY.year, TODAY.month
 
     # Sidebar: configuración
@@ -205,9 +327,10 @@ def dashboard():
                 acc.rate    = st.number_input("% interés/año", acc.rate, key=f"acc_r_{sid}")
                 c1, c2 = st.columns(2)
                 if c1.button("Guardar", key=f"acc_s_{sid}"):
-                    save_budget(user, prof, b); _rerun()
+                    if _dirty(b): log_mutation(uh, prof, b)
+                    _rerun()
                 if c2.button("❌", key=f"acc_d_{sid}"):
-                    b.accounts.remove(acc); save_budget(user, prof, b); _rerun()
+                    b.accounts.remove(acc); log_mutation(uh, prof, b); _rerun()
             st.markdown("---")
             nn = st.text_input("Nueva cuenta", key="acc_new_name")
             nb = st.number_input("Saldo inicial", 0.0, key="acc_new_bal")
@@ -215,7 +338,7 @@ def dashboard():
             nt = st.selectbox("Tipo", ["Débito","Certificado","Inversión"], key="acc_new_type")
             if st.button("Agregar cuenta", key="acc_new_btn") and nn:
                 b.accounts.append(Account(nn, nt, nb, nr))
-                save_budget(user, prof, b); _rerun()
+                log_mutation(uh, prof, b); _rerun()
 
         # Tarjetas de crédito
         with st.expander("Tarjetas de crédito"):
@@ -234,14 +357,15 @@ def dashboard():
                 c.cashback = st.number_input("% cashback", c.cashback, key=f"cc_cb_{sid}")
                 col1, col2 = st.columns(2)
                 if col1.button("Guardar", key=f"cc_s_{sid}"):
-                    save_budget(user, prof, b); _rerun()
+                    if _dirty(b): log_mutation(uh, prof, b)
+                    _rerun()
                 if col2.button("❌", key=f"cc_d_{sid}"):
-                    b.cards.remove(c); save_budget(user, prof, b); _rerun()
+                    b.cards.remove(c); log_mutation(uh, prof, b); _rerun()
             st.markdown("---")
             nt = st.text_input("Nueva tarjeta", key="cc_new_name")
             if st.button("Añadir tarjeta", key="cc_new_btn") and nt:
                 b.cards.append(CreditCard(nt, 0.0, 15, 5))
-                save_budget(user, prof, b); _rerun()
+                log_mutation(uh, prof, b); _rerun()
 
         # Deudas
         with st.expander("Deudas"):
@@ -253,14 +377,15 @@ def dashboard():
                 d.min_payment = st.number_input("Pago mínimo", d.min_payment, key=f"deb_m_{sid}")
                 c1, c2 = st.columns(2)
                 if c1.button("Guardar", key=f"deb_s_{sid}"):
-                    save_budget(user, prof, b); _rerun()
+                    if _dirty(b): log_mutation(uh, prof, b)
+                    _rerun()
                 if c2.button("❌", key=f"deb_d_{sid}"):
-                    b.debts.remove(d); save_budget(user, prof, b); _rerun()
+                    b.debts.remove(d); log_mutation(uh, prof, b); _rerun()
             st.markdown("---")
             nd = st.text_input("Nueva deuda", key="deb_new_name")
             if st.button("Agregar deuda", key="deb_new_btn") and nd:
                 b.debts.append(Debt(nd, 0.0, 0.0, 0.0))
-                save_budget(user, prof, b); _rerun()
+                log_mutation(uh, prof, b); _rerun()
 
         # Metas de ahorro
         with st.expander("Metas de ahorro"):
@@ -271,9 +396,9 @@ def dashboard():
                 add = st.number_input("Aportar", 0.0, key=f"goal_add_{sid}")
                 c1, c2 = st.columns(2)
                 if c1.button("Sumar", key=f"goal_plus_{sid}") and add:
-                    g.saved += add; save_budget(user, prof, b); _rerun()
+                    g.saved += add; log_mutation(uh, prof, b); _rerun()
                 if c2.button("❌", key=f"goal_del_{sid}"):
-                    b.goals.remove(g); save_budget(user, prof, b); _rerun()
+                    b.goals.remove(g); log_mutation(uh, prof, b); _rerun()
             st.markdown("---")
             with st.form("goal_form"):
                 gn = st.text_input("Nombre meta")
@@ -281,7 +406,7 @@ def dashboard():
                 gd = st.date_input("Fecha límite", TODAY + relativedelta(months=12))
                 if st.form_submit_button("Crear meta") and gn:
                     b.goals.append(Goal(gn, gt, gd.isoformat()))
-                    save_budget(user, prof, b); _rerun()
+                    log_mutation(uh, prof, b); _rerun()
 
         st.divider()
 
@@ -295,12 +420,12 @@ def dashboard():
             src = st.selectbox("Cuenta destino", [a.name for a in b.accounts] + [c.name for c in b.cards], key="inc_src")
             irec= st.checkbox("Recurrente", key="inc_rec")
             if st.form_submit_button("Guardar ingreso"):
-                for a in b.accounts:
-                    if a.name == src: a.balance += iam
-                for c in b.cards:
-                    if c.name == src: c.balance -= iam
-                b.incomes.append(Transaction(idt.isoformat(), iam, icat, isub, src, irec))
-                save_budget(user, prof, b); _rerun()
+                accs, cards = _by_name(b)
+                if src in accs:  accs[src].balance  += iam
+                if src in cards: cards[src].balance -= iam
+                t = Transaction(idt.isoformat(), iam, icat, isub, src, irec)
+                b.incomes.append(t)
+                log_mutation(uh, prof, b, {"op":"add","kind":"incomes","tx":t}); _rerun()
 
         # Formulario gasto
         with st.form("exp_form"):
@@ -314,87 +439,102 @@ def dashboard():
                 "Savings":["Fondo emergencia","Inversión","Ahorro meta"],
                 "Deuda":["Pago préstamo"], "Pago tarjeta":["Saldo tarjeta"]
             }
-            used = sorted({t.subcat for t in b.expenses if t.category==gcat})
+            used = sorted(b._subcats.get(gcat, ()))
             sel = st.selectbox("Sub-cat", ["Otro…"] + sug.get(gcat,[]) + used, key="exp_sub_sel")
             gsub= st.text_input("Nueva sub-cat", key="exp_sub_new") if sel=="Otro…" else sel
             src = st.selectbox("Fuente", [a.name for a in b.accounts]+[c.name for c in b.cards], key="exp_src")
             grec= st.checkbox("Recurrente", key="exp_rec")
             if st.form_submit_button("Guardar gasto") and gsub:
-                for a in b.accounts:
-                    if a.name==src: a.balance -= gam
-                for c in b.cards:
-                    if c.name==src:
-                        c.balance += gam
-                        if c.cashback:
-                            cb = gam * c.cashback / 100
-                            c.balance -= cb
-                            for a in b.accounts:
-                                if a.type=="Débito": a.balance += cb; break
-                b.expenses.append(Transaction(gdt.isoformat(), gam, gcat, gsub, src, grec))
-                save_budget(user, prof, b); _rerun()
+                accs, cards = _by_name(b)
+                if src in accs: accs[src].balance -= gam
+                if src in cards:
+                    c = cards[src]
+                    c.balance += gam
+                    if c.cashback:
+                        cb = gam * c.cashback / 100
+                        c.balance -= cb
+                        for a in b.accounts:
+                            if a.type=="Débito": a.balance += cb; break
+                t = Transaction(gdt.isoformat(), gam, gcat, gsub, src, grec)
+                b.expenses.append(t); b._subcats[gcat].add(gsub)
+                log_mutation(uh, prof, b, {"op":"add","kind":"expenses","tx":t}); _rerun()
 
     # Cuerpo principal
     st.title(f"📊 Presupuesto — {prof}")
 
     # Recordatorios tarjetas
-    for c in b.cards:
-        pay_date = dt.date(TODAY.year, TODAY.month, c.pay_day)
-        if 0 <= (pay_date - TODAY).days <= 5:
-            st.warning(f"💳 {c.name}: paga antes del {pay_date.strftime('%d/%m')}")
+    # días hasta el pago como enteros; sólo se crean fechas para las tarjetas avisadas
+    last = calendar.monthrange(y, m)[1]          # pay_day 31 en un mes de 30 → último día
+    pay  = np.minimum(np.fromiter((c.pay_day for c in b.cards), dtype=np.int64, count=len(b.cards)), last)
+    due  = np.flatnonzero((pay - TODAY.day >= 0) & (pay - TODAY.day <= 5))
+    if due.size:
+        st.warning("  \n".join(
+            f"💳 {b.cards[i].name}: paga antes del {dt.date(y, m, int(pay[i])).strftime('%d/%m')}"
+            for i in due
+        ))
 
     # Saldos
     st.subheader("Saldos actuales")
-    bal_df = pd.DataFrame(
-        [{"Fuente":a.name,"Tipo":a.type,"Saldo":a.balance} for a in b.accounts] +
-        [{"Fuente":c.name,"Tipo":"Crédito","Saldo":-c.balance,"Límite":c.limit} for c in b.cards]
-    )
-    st.dataframe(bal_df.style.format({"Saldo":"RD$ {:,.0f}","Límite":"RD$ {:,.0f}"}))
+    na, nc = len(b.accounts), len(b.cards)
+    bal_df = pd.DataFrame({
+        "Fuente": [a.name for a in b.accounts] + [c.name for c in b.cards],
+        "Tipo"  : [a.type for a in b.accounts] + ["Crédito"] * nc,
+        "Saldo" : np.concatenate([_f64((a.balance for a in b.accounts), na),
+                                  -_f64((c.balance for c in b.cards), nc)]),
+        "Límite": np.concatenate([np.full(na, np.nan), _f64((c.limit for c in b.cards), nc)]),
+    })
+    st.dataframe(bal_df.assign(Saldo=_money(bal_df["Saldo"]), Límite=_money(bal_df["Límite"])))
 
     passive = sum(a.balance * a.rate / 100 / 12 for a in b.accounts)
     st.metric("Ingresos pasivos (mes)", f"RD$ {passive:,.0f}")
 
+    # Gastos: DataFrame para las tablas; vista columnar (fechas parseadas al cargar) para agregados
+    exp_df = _tx_frame(b.expenses)
+    ea   = b._exp_arr
+    in_m = ea["date"].astype("datetime64[M]") == np.datetime64(f"{y:04d}-{m:02d}")
+    # una sola pasada: suma y conteo por código de categoría dentro del mes
+    codes, ncat = ea["cat"].codes[in_m], len(ea["cat"].categories)
+    month_cat = pd.Series(np.bincount(codes, weights=ea["amount"][in_m], minlength=ncat),
+                          index=ea["cat"].categories)[np.bincount(codes, minlength=ncat) > 0]
+
     # Distribución 50-20-30
-    needs  = sum(t.amount for t in b.expenses if t.category=="Needs"   and _ym(t.date)==(y,m))
-    wants  = sum(t.amount for t in b.expenses if t.category=="Wants"   and _ym(t.date)==(y,m))
-    saves  = sum(t.amount for t in b.expenses if t.category=="Savings" and _ym(t.date)==(y,m))
+    needs, wants, saves = (month_cat.get(k, 0.0) for k in ("Needs","Wants","Savings"))
     pie_df = pd.DataFrame({"Monto":[needs,wants,saves]}, index=["Needs","Wants","Savings"])
     c1, c2 = st.columns(2)
     with c1:
         st.subheader("Distribución 50-20-30 (mes)")
-        st.pyplot(pie50(pie_df))
+        st.image(pie50(pie_df), width="stretch")
     with c2:
-        cat_df = (
-            pd.DataFrame([t.amount for t in b.expenses if _ym(t.date)==(y,m)],
-                         index=[t.category for t in b.expenses if _ym(t.date)==(y,m)],
-                         columns=["Monto"])
-            .groupby(level=0).sum()
-        )
+        cat_df = month_cat.to_frame("Monto")
         st.subheader("Gasto por categoría (mes)")
-        if not cat_df.empty: st.pyplot(bar_spend(cat_df))
+        if not cat_df.empty: st.image(bar_spend(cat_df), width="stretch")
         else: st.info("Sin gastos este mes")
 
     # Evolución mensual
-    evo = pd.DataFrame(b.expenses)
-    if not evo.empty:
-        evo["Mes"] = pd.to_datetime(evo["date"]).dt.to_period("M")
-        evol = evo.pivot_table(index="Mes", columns="category", values="amount", aggfunc="sum").fillna(0)
+    if b.expenses:
+        # fechas ya parseadas en la vista columnar: sin volver a leer las cadenas ISO
+        evol = (pd.Series(ea["amount"])
+                .groupby([ea["date"].astype("datetime64[M]"), ea["cat"]], observed=True).sum()
+                .unstack(fill_value=0))
+        evol.index = evol.index.to_period("M")
         st.subheader("Evolución mensual de gastos")
-        st.pyplot(line_month(evol))
+        st.image(line_month(evol), width="stretch")
 
     # Forecast 12 meses
-    avg_cf = sum(b.cashflow_m(y, i) for i in range(1,13)) / 12
+    avg_cf = b.cashflow_y(y).mean()
     months = pd.date_range(first_m(y,m), periods=12, freq="M")
     st.subheader("Forecast 12 meses (cash-flow medio)")
     st.line_chart(pd.DataFrame({"Cash-Flow":[avg_cf]*12}, index=months.strftime("%b %Y")))
 
     # Eliminación de Ingresos
     st.subheader("Ingresos")
+    inc_df = _tx_frame(b.incomes)
     if b.incomes:
-        inc_df = pd.DataFrame([asdict(t) for t in b.incomes])
         inc_df["Monto"] = inc_df["amount"]
         st.dataframe(
             inc_df[["date","category","subcat","source","Monto"]]
-            .rename(columns={"date":"Fecha","category":"Cat","subcat":"Sub","source":"Fuente"})
+            .rename(columns={"date":"Fecha","category":"Cat","subcat":"Sub","source":"Fuente"}),
+            column_config={"Monto":_RD_COL}
         )
         to_del = st.multiselect(
             "Selecciona índices para eliminar ingresos",
@@ -402,24 +542,25 @@ def dashboard():
             format_func=lambda i: f"{i}: RD$ {inc_df.loc[i,'Monto']:,.2f}"
         )
         if st.button("Eliminar ingresos seleccionados"):
-            for idx in sorted(to_del, reverse=True):
-                t = b.incomes.pop(idx)
-                for a in b.accounts:
-                    if a.name==t.source: a.balance -= t.amount
-                for c in b.cards:
-                    if c.name==t.source: c.balance += t.amount
-            save_budget(user, prof, b); _rerun()
+            drop, delta = set(to_del), Counter()
+            for i in drop: delta[b.incomes[i].source] += b.incomes[i].amount
+            b.incomes = [t for i, t in enumerate(b.incomes) if i not in drop]
+            accs, cards = _by_name(b)
+            for src, amt in delta.items():
+                if src in accs:  accs[src].balance  -= amt
+                if src in cards: cards[src].balance += amt
+            log_mutation(uh, prof, b, {"op":"del","kind":"incomes","idx":to_del}); _rerun()
     else:
         st.info("Sin ingresos registrados")
 
     # Eliminación de Gastos
     st.subheader("Gastos")
     if b.expenses:
-        exp_df = pd.DataFrame([asdict(t) for t in b.expenses])
         exp_df["Monto"] = exp_df["amount"]
         st.dataframe(
             exp_df[["date","category","subcat","source","Monto"]]
-            .rename(columns={"date":"Fecha","category":"Cat","subcat":"Sub","source":"Fuente"})
+            .rename(columns={"date":"Fecha","category":"Cat","subcat":"Sub","source":"Fuente"}),
+            column_config={"Monto":_RD_COL}
         )
         to_del = st.multiselect(
             "Selecciona índices para eliminar gastos",
@@ -427,27 +568,27 @@ def dashboard():
             format_func=lambda i: f"{i}: RD$ {exp_df.loc[i,'Monto']:,.2f}"
         )
         if st.button("Eliminar gastos seleccionados"):
-            for idx in sorted(to_del, reverse=True):
-                t = b.expenses.pop(idx)
-                for a in b.accounts:
-                    if a.name==t.source: a.balance += t.amount
-                for c in b.cards:
-                    if c.name==t.source: c.balance -= t.amount
-            save_budget(user, prof, b); _rerun()
+            drop, delta = set(to_del), Counter()
+            for i in drop: delta[b.expenses[i].source] += b.expenses[i].amount
+            b.expenses = [t for i, t in enumerate(b.expenses) if i not in drop]
+            accs, cards = _by_name(b)
+            for src, amt in delta.items():
+                if src in accs:  accs[src].balance  += amt
+                if src in cards: cards[src].balance -= amt
+            log_mutation(uh, prof, b, {"op":"del","kind":"expenses","idx":to_del}); _rerun()
     else:
         st.info("Sin gastos registrados")
 
     # Historial global
     st.subheader("Historial global")
     if b.incomes or b.expenses:
-        comb = (
-            [{"Fecha":t.date,"Tipo":"Ingreso","Cat":t.category,"Sub":t.subcat,
-              "Fuente":t.source,"Monto":t.amount} for t in b.incomes] +
-            [{"Fecha":t.date,"Tipo":"Gasto","Cat":t.category,"Sub":t.subcat,
-              "Fuente":t.source,"Monto":-t.amount} for t in b.expenses]
+        cols = {"date":"Fecha","Tipo":"Tipo","category":"Cat","subcat":"Sub","source":"Fuente","amount":"Monto"}
+        parts = [inc_df.assign(Tipo="Ingreso"), exp_df.assign(Tipo="Gasto", amount=-exp_df["amount"])]
+        hdf = (
+            pd.concat([df[list(cols)] for df in parts if not df.empty], ignore_index=True)
+            .rename(columns=cols).sort_values("Fecha",ascending=False).reset_index(drop=True)
         )
-        hdf = pd.DataFrame(comb).sort_values("Fecha",ascending=False).reset_index(drop=True)
-        st.dataframe(hdf.style.format({"Monto":"RD$ {:,.0f}"}))
+        st.dataframe(hdf.assign(Monto=_money(hdf["Monto"])))
     else:
         st.info("Aún no hay movimientos")
 